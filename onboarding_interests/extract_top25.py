@@ -1,46 +1,58 @@
 import os
-import re
+from concurrent.futures import ThreadPoolExecutor
 
 def extract_top_podcasts(file_path, count=25):
     """Extract top N podcast names from a chart file."""
+    # Names are collected in a single pass over the file. A chart either has an
+    # explicit "1" rank, or starts with the first podcast on the line after the
+    # header and only numbers from "2". Each reading is tracked until we know
+    # which format this file uses; an explicit "1" always wins.
+    from_one = None   # Names after the first "1" rank
+    from_two = None   # Names after the first "2" rank, used when there is no "1"
+    from_start = []   # Names after any rank, used when there is neither
+    first_name = None
+    after_rank = False
+    idx = 0
+
     with open(file_path, 'r') as f:
-        content = f.read()
+        for raw in f:
+            line = raw.strip()
+            if idx == 0 and not line:
+                # Ignore leading blank lines so the header is line 0
+                continue
+            if idx == 1:
+                first_name = line
+            idx += 1
 
-    lines = content.strip().split('\n')
-    podcasts = []
-    i = 0
+            # The line after a rank number is the podcast name
+            if after_rank and line and not line.startswith('"'):
+                if from_one is not None:
+                    from_one.append(line)
+                else:
+                    from_start.append(line)
+                    if from_two is not None:
+                        from_two.append(line)
 
-    # Look for the first "1" or "2" to determine format
-    first_one_idx = None
-    first_two_idx = None
-    for idx, line in enumerate(lines):
-        if line.strip() == '1':
-            first_one_idx = idx
-            break
-        if line.strip() == '2' and first_two_idx is None:
-            first_two_idx = idx
+            if from_one is None:
+                if line == '1':
+                    from_one = []
+                elif line == '2' and from_two is None:
+                    from_two = []
+            elif len(from_one) >= count:
+                break
 
-    if first_one_idx is not None:
-        # Format: has explicit "1" rank
-        i = first_one_idx
-    elif first_two_idx is not None:
-        # Format: no "1", first entry is after header, look backwards from "2"
-        # The first podcast is after the header line (line 0) at line 1
-        podcast_name = lines[1].strip()
-        if podcast_name and not podcast_name.startswith('"'):
-            podcasts.append(podcast_name)
-        i = first_two_idx
+            after_rank = line.isdigit()
 
-    # Now extract podcasts starting from numbered ranks
-    while i < len(lines) and len(podcasts) < count:
-        line = lines[i].strip()
-        if re.match(r'^\d+$', line):
-            # Next line is the podcast name
-            if i + 1 < len(lines):
-                podcast_name = lines[i + 1].strip()
-                if podcast_name and not podcast_name.startswith('"'):
-                    podcasts.append(podcast_name)
-        i += 1
+    if from_one is not None:
+        # Format: has explicit "1" rank
+        podcasts = from_one
+    elif from_two is not None:
+        # Format: no "1", the first podcast is on the line after the header
+        podcasts = from_two
+        if first_name and not first_name.startswith('"'):
+            podcasts.insert(0, first_name)
+    else:
+        podcasts = from_start
 
     return podcasts[:count]
 
@@ -48,13 +60,19 @@ def main():
     folder = '/Users/mokes/projects/pcc_new/onboarding_interests'
     output_lines = []
 
+    categories = []
+    file_paths = []
     for filename in sorted(os.listdir(folder)):
         if filename.endswith('.txt') and filename != 'top25_all_categories.txt':
-            category = filename.replace('.txt', '')
-            file_path = os.path.join(folder, filename)
+            categories.append(filename.replace('.txt', ''))
+            file_paths.append(os.path.join(folder, filename))
 
-            podcasts = extract_top_podcasts(file_path, 25)
+    # Each chart file is independent and I/O-bound, so read them in parallel;
+    # map() yields results in input order, keeping the output sorted
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        all_podcasts = executor.map(extract_top_podcasts, file_paths)
 
+        for category, podcasts in zip(categories, all_podcasts):
             output_lines.append(f"=== {category} ===")
             for i, podcast in enumerate(podcasts, 1):
                 output_lines.append(f"{i}. {podcast}")
@@ -2,55 +2,225 @@ import os
 import re
 import json
 import time
-import urllib.request
+import sqlite3
+import asyncio
 import urllib.parse
 import sys
 
-def search_itunes(podcast_name, retries=3):
+import aiohttp
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Maximum number of iTunes lookups in flight at once
+CONCURRENCY = 8
+
+# iTunes Search allows roughly 300 requests per minute
+REQUESTS_PER_MINUTE = 300
+BURST = 20
+
+# Raw iTunes responses are reused across runs for 30 days
+CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+class TokenBucket:
+    """Async token bucket: bursts up to `capacity`, then refills at `rate` tokens/second."""
+
+    def __init__(self, rate, capacity):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.throttled_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate != self.base_rate and now >= self.throttled_until:
+            self.rate = self.base_rate
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Take one token, sleeping only if the bucket is empty."""
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def throttle(self, seconds=60):
+        """Halve the refill rate for the next `seconds` after a 429."""
+        self._refill()
+        now = time.monotonic()
+        if now >= self.throttled_until:
+            self.rate = self.base_rate / 2
+        self.throttled_until = now + seconds
+
+def open_cache(cache_file):
+    """Open (creating if needed) the on-disk cache of raw iTunes responses."""
+    conn = sqlite3.connect(cache_file)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS itunes_cache "
+        "(query TEXT PRIMARY KEY, response_json TEXT NOT NULL, ts INTEGER NOT NULL)"
+    )
+    return conn
+
+def cache_get(cache, query):
+    """Return the cached response for a query, or None if missing or expired."""
+    row = cache.execute(
+        "SELECT response_json FROM itunes_cache WHERE query = ? AND ts >= ?",
+        (query, int(time.time()) - CACHE_TTL_SECONDS)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+def cache_put(cache, query, data):
+    """Store a raw iTunes response (a hit) for a query."""
+    cache.execute(
+        "INSERT OR REPLACE INTO itunes_cache (query, response_json, ts) VALUES (?, ?, ?)",
+        (query, json.dumps(data), int(time.time()))
+    )
+    cache.commit()
+
+async def search_itunes(session, bucket, cache, podcast_name, retries=3):
     """Search iTunes for a podcast and return the feed URL."""
+    query = urllib.parse.urlencode({
+        'term': podcast_name,
+        'media': 'podcast',
+        'limit': 1
+    })
+
+    data = cache_get(cache, query)
+    if data is None:
+        data = await fetch_itunes(session, bucket, query, podcast_name, retries)
+        if data is None:
+            return None
+        # Only cache hits, so podcasts that weren't found are retried next run
+        if data.get('resultCount', 0) > 0:
+            cache_put(cache, query, data)
+
+    if data.get('resultCount', 0) > 0:
+        result = data['results'][0]
+        return {
+            'name': result.get('collectionName', podcast_name),
+            'feed_url': result.get('feedUrl', ''),
+            'itunes_id': result.get('collectionId', ''),
+            'artwork': result.get('artworkUrl600', '')
+        }
+    return None
+
+async def fetch_itunes(session, bucket, query, podcast_name, retries=3):
+    """Run an iTunes search query and return the raw response, or None on failure."""
+    url = f"https://itunes.apple.com/search?{query}"
+
     for attempt in range(retries):
+        await bucket.acquire()
         try:
-            query = urllib.parse.urlencode({
-                'term': podcast_name,
-                'media': 'podcast',
-                'limit': 1
-            })
-            url = f"https://itunes.apple.com/search?{query}"
-
-            with urllib.request.urlopen(url, timeout=15) as response:
-                data = json.loads(response.read().decode())
-
-            if data.get('resultCount', 0) > 0:
-                result = data['results'][0]
-                return {
-                    'name': result.get('collectionName', podcast_name),
-                    'feed_url': result.get('feedUrl', ''),
-                    'itunes_id': result.get('collectionId', ''),
-                    'artwork': result.get('artworkUrl600', '')
-                }
-            return None
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=15)) as response:
+                if response.status in (429, 403):
+                    if response.status == 429:
+                        bucket.throttle()
+                    wait = 6 * 2 ** attempt
+                    reason = "Rate limited" if response.status == 429 else "403 error"
+                    print(f"    {reason} on {podcast_name:.50}, waiting {wait}s...")
+                    sys.stdout.flush()
+                    await asyncio.sleep(wait)
+                    continue
+                response.raise_for_status()
+                # iTunes serves JSON as text/javascript
+                return await response.json(content_type=None)
         except Exception as e:
-            if '429' in str(e):
-                wait = (attempt + 1) * 6
-                print(f"    Rate limited, waiting {wait}s...")
-                sys.stdout.flush()
-                time.sleep(wait)
-            elif '403' in str(e):
-                wait = (attempt + 1) * 6
-                print(f"    403 error, waiting {wait}s...")
-                sys.stdout.flush()
-                time.sleep(wait)
-            else:
-                print(f"    Error: {e}")
-                sys.stdout.flush()
-                return None
+            print(f"    Error: {e}")
+            sys.stdout.flush()
+            return None
     return None
 
-def save_results(results, folder):
+async def resolve_feed(session, sem, bucket, cache, log, number, category, podcast_name):
+    """Look up one podcast, holding a concurrency slot for the duration."""
+    async with sem:
+        print(f"[{number}] {podcast_name:.50}...")
+        sys.stdout.flush()
+        info = await search_itunes(session, bucket, cache, podcast_name)
+
+    # Append to the working log so an interrupted run can resume
+    log.write(json.dumps({'category': category, 'original_name': podcast_name, 'info': info}) + "\n")
+    log.flush()
+
+    if info and info.get('feed_url'):
+        print(f"    ✓ [{number}] {info['feed_url']:.70}")
+    else:
+        print(f"    ✗ [{number}] Not found")
+    sys.stdout.flush()
+    return category, podcast_name, info
+
+def apply_lookup(results_idx, category, podcast_name, info):
+    """Record a lookup in results_idx. Returns True if a feed was found."""
+    entries = results_idx[category]
+    if info and info.get('feed_url'):
+        # Overwrites any earlier not-found entry (retry case)
+        entries[podcast_name] = {
+            'original_name': podcast_name,
+            'itunes_name': info['name'],
+            'feed_url': info['feed_url'],
+            'itunes_id': info['itunes_id'],
+            'artwork': info['artwork']
+        }
+        return True
+    # Only add if not already there
+    entries.setdefault(podcast_name, {
+        'original_name': podcast_name,
+        'feed_url': '',
+        'error': 'Not found'
+    })
+    return False
+
+def replay_log(results_idx, log_file):
+    """Apply lookups from an interrupted run's JSONL log. Returns the number replayed."""
+    replayed = 0
+    with open(log_file, 'r') as f:
+        for raw in f:
+            try:
+                record = json.loads(raw)
+            except json.JSONDecodeError:
+                # A crash mid-write can leave a truncated final line
+                continue
+            results_idx.setdefault(record['category'], {})
+            apply_lookup(results_idx, record['category'], record['original_name'], record['info'])
+            replayed += 1
+    return replayed
+
+def order_like_input(results_idx, entries):
+    """
+    Return results_idx with categories and podcasts in input (chart) order.
+    Podcasts that are not in the input keep their order after the ranked ones.
+    """
+    ordered = {}
+    for category, podcast_name in entries:
+        podcasts = results_idx[category]
+        if podcast_name in podcasts:
+            ordered.setdefault(category, {})[podcast_name] = podcasts[podcast_name]
+    for category, podcasts in results_idx.items():
+        target = ordered.setdefault(category, {})
+        for podcast_name, podcast in podcasts.items():
+            target.setdefault(podcast_name, podcast)
+    return ordered
+
+def save_results(results_idx, folder):
     """Save current results to files."""
+    # Downstream consumers expect a list of podcasts per category
+    results = {category: list(entries.values()) for category, entries in results_idx.items()}
+
     output_json = os.path.join(folder, 'podcasts_with_feeds.json')
-    with open(output_json, 'w') as f:
-        json.dump(results, f, indent=2)
+    if orjson is not None:
+        # Much faster than the stdlib encoder for the full results dict
+        with open(output_json, 'wb') as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    else:
+        with open(output_json, 'w') as f:
+            json.dump(results, f, indent=2)
 
     output_txt = os.path.join(folder, 'podcasts_with_feeds.txt')
     with open(output_txt, 'w') as f:
@@ -61,92 +231,98 @@ def save_results(results, folder):
                 f.write(f"   RSS: {p.get('feed_url', 'NOT FOUND')}\n")
             f.write("\n")
 
-def main():
+async def main():
     folder = '/Users/mokes/projects/pcc_new/onboarding_interests'
     input_file = os.path.join(folder, 'top25_all_categories.txt')
     output_json = os.path.join(folder, 'podcasts_with_feeds.json')
+    log_file = os.path.join(folder, 'podcasts_with_feeds.jsonl')
+    cache_file = os.path.join(folder, 'itunes_cache.sqlite')
 
-    with open(input_file, 'r') as f:
-        content = f.read()
-
-    # Load existing results to resume
-    results = {}
+    # Load existing results to resume, indexed as results_idx[category][original_name]
+    results_idx = {}
     if os.path.exists(output_json):
         with open(output_json, 'r') as f:
-            results = json.load(f)
-        print(f"Resuming from existing file with {len(results)} categories")
+            results_idx = {
+                category: {p['original_name']: p for p in podcasts}
+                for category, podcasts in json.load(f).items()
+            }
+        print(f"Resuming from existing file with {len(results_idx)} categories")
+        sys.stdout.flush()
+    if os.path.exists(log_file):
+        replayed = replay_log(results_idx, log_file)
+        print(f"Replayed {replayed} lookups from {os.path.basename(log_file)}")
         sys.stdout.flush()
 
+    # Flatten the input into (category, podcast_name) pairs
+    entries = []
     current_category = None
-    total = 0
-    found = 0
-    skipped = 0
+    with open(input_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
 
-    for line in content.split('\n'):
-        line = line.strip()
-        if not line:
-            continue
+            match = re.match(r'^=== (.+) ===$', line)
+            if match:
+                current_category = match.group(1)
+                # Only create new index if category doesn't exist
+                if current_category not in results_idx:
+                    results_idx[current_category] = {}
+                continue
 
-        match = re.match(r'^=== (.+) ===$', line)
-        if match:
-            current_category = match.group(1)
-            # Only create new list if category doesn't exist
-            if current_category not in results:
-                results[current_category] = []
-            print(f"\n{'='*50}")
-            print(f"{current_category}")
-            print(f"{'='*50}")
-            sys.stdout.flush()
-            continue
+            match = re.match(r'^\d+\. (.+)$', line)
+            if match and current_category:
+                entries.append((current_category, match.group(1)))
 
-        match = re.match(r'^\d+\. (.+)$', line)
-        if match and current_category:
-            podcast_name = match.group(1)
-            total += 1
-
-            # Check if we already have this podcast with a feed_url
-            existing = next((p for p in results[current_category] if p.get('original_name') == podcast_name), None)
-            if existing and existing.get('feed_url'):
-                skipped += 1
-                print(f"[{total}] {podcast_name[:50]}... (cached)")
-                sys.stdout.flush()
-                continue
+    total = len(entries)
+    skipped = 0
+    found = 0
 
-            print(f"[{total}] {podcast_name[:50]}...")
-            sys.stdout.flush()
+    # Check if we already have each podcast with a feed_url
+    pending = []
+    for number, (category, podcast_name) in enumerate(entries, 1):
+        existing = results_idx[category].get(podcast_name)
+        if existing and existing.get('feed_url'):
+            skipped += 1
+            print(f"[{number}] {podcast_name:.50}... (cached)")
+            continue
+        pending.append((number, category, podcast_name))
+    sys.stdout.flush()
 
-            info = search_itunes(podcast_name)
-            if info and info.get('feed_url'):
-                found += 1
-                # Remove old entry if exists (retry case)
-                results[current_category] = [p for p in results[current_category] if p.get('original_name') != podcast_name]
-                results[current_category].append({
-                    'original_name': podcast_name,
-                    'itunes_name': info['name'],
-                    'feed_url': info['feed_url'],
-                    'itunes_id': info['itunes_id'],
-                    'artwork': info['artwork']
-                })
-                print(f"    ✓ {info['feed_url'][:70]}")
-            else:
-                # Only add if not already there
-                if not existing:
-                    results[current_category].append({
-                        'original_name': podcast_name,
-                        'feed_url': '',
-                        'error': 'Not found'
-                    })
-                print(f"    ✗ Not found")
-            sys.stdout.flush()
+    print(f"\nLooking up {len(pending)} of {total} podcasts ({CONCURRENCY} at a time)")
+    sys.stdout.flush()
+
+    sem = asyncio.Semaphore(CONCURRENCY)
+    bucket = TokenBucket(rate=REQUESTS_PER_MINUTE / 60, capacity=BURST)
+    cache = open_cache(cache_file)
+    with open(log_file, 'a') as log:
+        # One keep-alive pool to itunes.apple.com, sized to the concurrency, so
+        # TLS handshakes are paid once per connection rather than per lookup
+        connector = aiohttp.TCPConnector(
+            limit=CONCURRENCY,
+            limit_per_host=CONCURRENCY,
+            keepalive_timeout=60,
+            ttl_dns_cache=300
+        )
+        async with aiohttp.ClientSession(connector=connector) as session:
+            tasks = [resolve_feed(session, sem, bucket, cache, log, *entry) for entry in pending]
+            lookups = await asyncio.gather(*tasks)
+    cache.close()
 
-            # Save after each podcast
-            save_results(results, folder)
+    # Apply in input order so each category keeps its chart ranking
+    for category, podcast_name, info in lookups:
+        if apply_lookup(results_idx, category, podcast_name, info):
+            found += 1
 
-            time.sleep(1.5)  # Longer delay to avoid rate limiting
+    # Replayed lookups were applied in completion order; restore chart ranking
+    results_idx = order_like_input(results_idx, entries)
+    save_results(results_idx, folder)
+    # Everything in the log is now in the JSON output
+    os.remove(log_file)
 
     print(f"\n\nDone! Found {found} new feeds, skipped {skipped} cached")
     print(f"Saved to {folder}/podcasts_with_feeds.json")
     print(f"Saved to {folder}/podcasts_with_feeds.txt")
 
 if __name__ == '__main__':
-    main()
+    asyncio.run(main())
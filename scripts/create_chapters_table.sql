@@ -12,7 +12,9 @@ CREATE TABLE IF NOT EXISTS public.chapters (
 
 -- Create indexes
 CREATE INDEX IF NOT EXISTS chapters_episode_id_idx ON public.chapters USING btree (episode_id);
-CREATE INDEX IF NOT EXISTS chapters_time_idx ON public.chapters USING btree (episode_id, start_seconds);
+-- Unique so upload_chapters.py can upsert; existing databases need
+-- supabase/migrations/20261015000000_chapters_unique_start.sql
+CREATE UNIQUE INDEX IF NOT EXISTS chapters_episode_start_key ON public.chapters USING btree (episode_id, start_seconds);
 
 -- Add comment
 COMMENT ON TABLE public.chapters IS 'Podcast episode chapters with titles and timestamps';
\ No newline at end of file
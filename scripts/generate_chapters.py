@@ -2,21 +2,38 @@
 
 import os
 import json
+import time
 import argparse
 from pathlib import Path
 from typing import List, Dict
 import openai
+import tiktoken
 from openai import OpenAI
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Fallback tokenizer for models tiktoken does not know about
+DEFAULT_ENCODING = "o200k_base"
+
 class ChapterGenerator:
     def __init__(self):
         # Initialize OpenAI
         self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+        # Tokenizers are costly to load, so keep one per model
+        self._encodings = {}
+
+    def get_encoding(self, model: str) -> tiktoken.Encoding:
+        """Get the (cached) tokenizer for a model."""
+        if model not in self._encodings:
+            try:
+                self._encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encodings[model] = tiktoken.get_encoding(DEFAULT_ENCODING)
+        return self._encodings[model]
+
     def load_transcript(self, transcript_file: str) -> Dict:
         """Load transcript from JSON file."""
         with open(transcript_file, 'r') as f:
@@ -30,13 +47,14 @@ class ChapterGenerator:
         else:
             return data
 
-    def prepare_segments_for_gpt(self, segments: List[Dict], max_chars: int = 50000, sample_rate: float = 1.0) -> str:
+    def prepare_segments_for_gpt(self, segments: List[Dict], model: str = "gpt-4o-mini", max_tokens: int = 100_000, sample_rate: float = 1.0) -> str:
         """
-        Prepare segments text for GPT, with timestamps and length limit.
+        Prepare segments text for GPT, with timestamps and a token budget.
 
         Args:
             segments: List of transcript segments
-            max_chars: Maximum characters to send to GPT
+            model: OpenAI model the text is for (selects the tokenizer)
+            max_tokens: Maximum transcript tokens to send to GPT
             sample_rate: Fraction of segments to include (1.0 = all, 0.5 = every other)
         """
         # Apply sampling if needed
@@ -45,41 +63,45 @@ class ChapterGenerator:
             segments = segments[::step]
             print(f"  Sampling every {step} segments (using {len(segments)} segments)")
 
-        # First, try to fit everything
-        full_text = []
-        total_length = 0
+        if not segments:
+            return ""
+
+        enc = self.get_encoding(model)
+
+        # First, try to fit everything, stopping as soon as the budget is blown
+        lines = []
+        total_tokens = 0
         for seg in segments:
-            line = f"[{seg['start']:.1f}-{seg['end']:.1f}] {seg['text']}\n"
-            total_length += len(line)
-            full_text.append(line)
+            line = self._format_segment(seg)
+            total_tokens += len(enc.encode(line, disallowed_special=()))
+            lines.append(line)
+            if total_tokens > max_tokens:
+                break
 
         # If it fits, return everything
-        if total_length <= max_chars:
-            print(f"  Using full transcript ({total_length:,} chars, {len(segments)} segments)")
-            return "".join(full_text)
+        if total_tokens <= max_tokens:
+            print(f"  Using full transcript ({total_tokens:,} tokens, {len(segments)} segments)")
+            return "".join(lines)
 
         # Otherwise, sample evenly across the entire podcast
-        print(f"  Transcript too long ({total_length:,} chars), sampling evenly...")
+        print(f"  Transcript too long (over {max_tokens:,} tokens), sampling evenly...")
 
-        # Calculate how many segments we can include
-        avg_line_length = total_length / len(segments)
-        segments_to_include = int(max_chars / avg_line_length)
+        # Calculate how many segments we can include, from the lines counted so far
+        avg_line_tokens = total_tokens / len(lines)
+        segments_to_include = max(1, int(max_tokens / avg_line_tokens))
 
         # Sample evenly throughout the podcast
         step = len(segments) / segments_to_include
-        sampled_indices = [int(i * step) for i in range(segments_to_include)]
-
-        result = []
-        result.append(f"[NOTE: Sampled {segments_to_include} of {len(segments)} segments evenly across the podcast]\n\n")
+        note = f"[NOTE: Sampled {segments_to_include} of {len(segments)} segments evenly across the podcast]\n\n"
+        sampled = "".join(self._format_segment(segments[int(i * step)]) for i in range(segments_to_include))
 
-        for idx in sampled_indices:
-            if idx < len(segments):
-                seg = segments[idx]
-                line = f"[{seg['start']:.1f}-{seg['end']:.1f}] {seg['text']}\n"
-                result.append(line)
+        print(f"  Sampled {segments_to_include} segments for chapter analysis")
+        return note + sampled
 
-        print(f"  Sampled {len(sampled_indices)} segments for chapter analysis")
-        return "".join(result)
+    @staticmethod
+    def _format_segment(seg: Dict) -> str:
+        """Format one segment as a timestamped transcript line."""
+        return f"[{seg['start']:.1f}-{seg['end']:.1f}] {seg['text']}\n"
 
     def build_chapters_prompt(self, segments_text: str, actual_duration_seconds: float, min_chapter_minutes: int = 5, max_chapters: int = 15) -> str:
         """
@@ -87,21 +109,16 @@ class ChapterGenerator:
 
         Args:
             segments_text: Prepared transcript text with timestamps
+            actual_duration_seconds: Episode length in seconds
             min_chapter_minutes: Minimum minutes per chapter
             max_chapters: Maximum number of chapters to create
         """
-        # Extract the last timestamp to know the full duration
-        import re
-        timestamps = re.findall(r'\[(\d+\.\d+)-\d+\.\d+\]', segments_text)
-
-        if not timestamps:
-            # Fallback if no timestamps found
+        if not actual_duration_seconds:
+            # Fallback if the duration is unknown
             duration_seconds = 3000
             duration_minutes = 50
         else:
-            # Get the last timestamp
-            all_timestamps = re.findall(r'\[\d+\.\d+-(\d+\.\d+)\]', segments_text)
-            duration_seconds = float(all_timestamps[-1]) if all_timestamps else float(timestamps[-1])
+            duration_seconds = actual_duration_seconds
             duration_minutes = int(duration_seconds / 60)
 
         # Calculate ideal number of chapters
@@ -142,13 +159,65 @@ Transcript with timestamps (may be sampled if long):
 {segments_text}
 """
 
+    def prepare_prompt(
+        self,
+        segments: List[Dict],
+        model: str = "gpt-4o-mini",
+        min_chapter_minutes: int = 5,
+        max_tokens: int = 100_000,
+        actual_duration_seconds: float = None
+    ) -> str:
+        """Prepare the transcript text and build the full chapters prompt."""
+        # The segments already carry the duration, no need to parse it back out
+        if actual_duration_seconds is None and segments:
+            actual_duration_seconds = segments[-1]['end']
+
+        # Prepare segments for GPT
+        segments_text = self.prepare_segments_for_gpt(segments, model, max_tokens)
+
+        # Build prompt
+        return self.build_chapters_prompt(segments_text, actual_duration_seconds, min_chapter_minutes)
+
+    def build_chat_request(self, prompt: str, model: str, temperature: float) -> Dict:
+        """Build the chat completion request body for a chapters prompt."""
+        return {
+            "model": model,
+            "temperature": temperature,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are an expert at analyzing podcast transcripts and creating clear, meaningful chapters that help listeners navigate the content."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "response_format": {"type": "json_object"}
+        }
+
+    def parse_chapters(self, content: str) -> List[Dict]:
+        """Parse the model's JSON reply into a list of chapters."""
+        result = json.loads(content)
+        chapters = result.get('chapters', [])
+
+        print(f"  ✓ Generated {len(chapters)} chapters")
+
+        # Validate chapters
+        if chapters:
+            first_start = chapters[0]['start_seconds']
+            last_end = chapters[-1]['end_seconds']
+            print(f"  Coverage: {first_start}s to {last_end}s ({last_end/60:.1f} minutes)")
+
+        return chapters
+
     def generate_chapters(
         self,
         segments: List[Dict],
         model: str = "gpt-4o-mini",
         temperature: float = 0.3,
         min_chapter_minutes: int = 5,
-        max_chars: int = 50000,
+        max_tokens: int = 100_000,
         actual_duration_seconds: float = None
     ) -> List[Dict]:
         """
@@ -159,7 +228,8 @@ Transcript with timestamps (may be sampled if long):
             model: OpenAI model to use
             temperature: Temperature for generation (lower = more focused)
             min_chapter_minutes: Minimum minutes per chapter
-            max_chars: Maximum characters to send to GPT
+            max_tokens: Maximum transcript tokens to send to GPT
+            actual_duration_seconds: Episode length (default: end of the last segment)
 
         Returns:
             List of chapters with title, start_seconds, end_seconds, and summary
@@ -167,46 +237,103 @@ Transcript with timestamps (may be sampled if long):
         print(f"\n📚 Generating chapters with {model}...")
         print(f"  Minimum chapter length: {min_chapter_minutes} minutes")
 
-        # Prepare segments for GPT
-        segments_text = self.prepare_segments_for_gpt(segments, max_chars)
-
-        # Build prompt
-        prompt = self.build_chapters_prompt(segments_text, min_chapter_minutes)
+        prompt = self.prepare_prompt(segments, model, min_chapter_minutes, max_tokens, actual_duration_seconds)
 
         try:
             response = self.openai_client.chat.completions.create(
-                model=model,
-                temperature=temperature,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert at analyzing podcast transcripts and creating clear, meaningful chapters that help listeners navigate the content."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                response_format={"type": "json_object"}
+                **self.build_chat_request(prompt, model, temperature)
             )
+            return self.parse_chapters(response.choices[0].message.content)
+
+        except Exception as e:
+            print(f"  ❌ Error generating chapters: {str(e)}")
+            return []
+
+    def generate_chapters_batch(
+        self,
+        transcripts: Dict[str, List[Dict]],
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.3,
+        min_chapter_minutes: int = 5,
+        max_tokens: int = 100_000,
+        poll_seconds: int = 30
+    ) -> Dict[str, List[Dict]]:
+        """
+        Generate chapters for many transcripts with one OpenAI Batch API job.
+
+        Batch jobs are billed at half price and run asynchronously (up to 24h),
+        so this suits bulk/nightly runs rather than interactive use.
+
+        Args:
+            transcripts: Mapping of an ID (e.g. the transcript path) to its segments
+            poll_seconds: Seconds between batch status checks
+
+        Returns:
+            Mapping of the same IDs to their chapters (empty list on failure)
+        """
+        print(f"\n📚 Generating chapters for {len(transcripts)} transcripts with {model} (batch)...")
+        print(f"  Minimum chapter length: {min_chapter_minutes} minutes")
+
+        # One JSONL request line per transcript, keyed by custom_id
+        lines = []
+        for custom_id, segments in transcripts.items():
+            print(f"\n  Preparing {custom_id}")
+            prompt = self.prepare_prompt(segments, model, min_chapter_minutes, max_tokens)
+            lines.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self.build_chat_request(prompt, model, temperature)
+            }))
+
+        results = {custom_id: [] for custom_id in transcripts}
 
-            content = response.choices[0].message.content
-            result = json.loads(content)
-            chapters = result.get('chapters', [])
+        try:
+            batch_input = self.openai_client.files.create(
+                file=("chapters_batch.jsonl", "\n".join(lines).encode()),
+                purpose="batch"
+            )
+            batch = self.openai_client.batches.create(
+                input_file_id=batch_input.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            print(f"\n  Submitted batch {batch.id}, waiting for it to finish...")
 
-            print(f"  ✓ Generated {len(chapters)} chapters")
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                time.sleep(poll_seconds)
+                batch = self.openai_client.batches.retrieve(batch.id)
+                counts = batch.request_counts
+                if counts:
+                    print(f"  {batch.status}: {counts.completed}/{counts.total} done")
 
-            # Validate chapters
-            if chapters:
-                first_start = chapters[0]['start_seconds']
-                last_end = chapters[-1]['end_seconds']
-                print(f"  Coverage: {first_start}s to {last_end}s ({last_end/60:.1f} minutes)")
+            if batch.status != "completed" or not batch.output_file_id:
+                print(f"  ❌ Batch {batch.id} ended with status {batch.status}")
+                return results
 
-            return chapters
+            output = self.openai_client.files.content(batch.output_file_id).text
 
         except Exception as e:
-            print(f"  ❌ Error generating chapters: {str(e)}")
-            return []
+            print(f"  ❌ Error running chapters batch: {str(e)}")
+            return results
+
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            custom_id = item['custom_id']
+            print(f"\n  {custom_id}")
+            response = item.get('response') or {}
+            if item.get('error') or response.get('status_code') != 200:
+                print(f"  ❌ Error generating chapters: {item.get('error') or response.get('body')}")
+                continue
+            try:
+                content = response['body']['choices'][0]['message']['content']
+                results[custom_id] = self.parse_chapters(content)
+            except Exception as e:
+                print(f"  ❌ Error parsing chapters: {str(e)}")
+
+        return results
 
     def save_chapters(self, chapters: List[Dict], output_file: str) -> None:
         """Save chapters to JSON file."""
@@ -234,14 +361,15 @@ Transcript with timestamps (may be sampled if long):
 
 
 def main():
-    parser = argparse.ArgumentParser(description='Generate chapters from podcast transcript')
-    parser.add_argument('transcript_file', help='Path to transcript JSON file')
-    parser.add_argument('-o', '--output', help='Output file for chapters (default: chapters.json)')
+    parser = argparse.ArgumentParser(description='Generate chapters from podcast transcripts')
+    parser.add_argument('transcript_files', nargs='+', help='Path(s) to transcript JSON file(s)')
+    parser.add_argument('-o', '--output', help='Output file for chapters, single transcript only (default: chapters.json)')
     parser.add_argument('--model', default='gpt-4o-mini', help='OpenAI model to use (default: gpt-4o-mini)')
     parser.add_argument('--temperature', type=float, default=0.3, help='Temperature for generation (default: 0.3)')
     parser.add_argument('--min-minutes', type=int, default=5, help='Minimum minutes per chapter (default: 5)')
-    parser.add_argument('--max-chars', type=int, default=50000, help='Max characters to send to GPT (default: 50000)')
+    parser.add_argument('--max-tokens', type=int, default=100_000, help='Max transcript tokens to send to GPT (default: 100000)')
     parser.add_argument('--sample-rate', type=float, default=1.0, help='Segment sampling rate, 1.0=all, 0.5=half (default: 1.0)')
+    parser.add_argument('--batch', action='store_true', help='Submit all transcripts as one OpenAI Batch API job (50%% cheaper, may take hours)')
 
     args = parser.parse_args()
 
@@ -251,52 +379,68 @@ def main():
         print("Please set it in your .env file or environment")
         return 1
 
-    # Set output file
-    if args.output:
-        output_file = args.output
-    else:
-        # Default: same directory as input, named chapters.json
-        input_path = Path(args.transcript_file)
-        output_file = input_path.parent / "chapters.json"
+    if args.output and len(args.transcript_files) > 1:
+        print("Error: --output can only be used with a single transcript file")
+        return 1
 
     # Process
     generator = ChapterGenerator()
 
-    # Load transcript
-    print(f"📖 Loading transcript from {args.transcript_file}")
-    transcript = generator.load_transcript(args.transcript_file)
+    # Load transcripts
+    transcripts = {}
+    for transcript_file in args.transcript_files:
+        print(f"📖 Loading transcript from {transcript_file}")
+        transcript = generator.load_transcript(transcript_file)
 
-    if 'segments' not in transcript:
-        print("Error: No segments found in transcript file")
-        return 1
+        if 'segments' not in transcript:
+            print("Error: No segments found in transcript file")
+            return 1
+
+        segments = transcript['segments']
+        print(f"  Loaded {len(segments)} segments")
 
-    segments = transcript['segments']
-    print(f"  Loaded {len(segments)} segments")
+        if segments:
+            duration = segments[-1]['end']
+            print(f"  Duration: {duration:.1f} seconds ({duration/60:.1f} minutes)")
 
-    if segments:
-        duration = segments[-1]['end']
-        print(f"  Duration: {duration:.1f} seconds ({duration/60:.1f} minutes)")
+        transcripts[transcript_file] = segments
 
     # Generate chapters
-    chapters = generator.generate_chapters(
-        segments,
+    options = dict(
         model=args.model,
         temperature=args.temperature,
         min_chapter_minutes=args.min_minutes,
-        max_chars=args.max_chars
+        max_tokens=args.max_tokens
     )
+    if args.batch:
+        all_chapters = generator.generate_chapters_batch(transcripts, **options)
+    else:
+        all_chapters = {
+            transcript_file: generator.generate_chapters(segments, **options)
+            for transcript_file, segments in transcripts.items()
+        }
+
+    exit_code = 0
+    for transcript_file, chapters in all_chapters.items():
+        if not chapters:
+            print(f"Failed to generate chapters for {transcript_file}")
+            exit_code = 1
+            continue
+
+        # Set output file
+        if args.output:
+            output_file = args.output
+        else:
+            # Default: same directory as input, named chapters.json
+            output_file = Path(transcript_file).parent / "chapters.json"
 
-    if not chapters:
-        print("Failed to generate chapters")
-        return 1
-
-    # Save chapters
-    generator.save_chapters(chapters, str(output_file))
+        # Save chapters
+        generator.save_chapters(chapters, str(output_file))
 
-    # Display chapters
-    generator.print_chapters(chapters)
+        # Display chapters
+        generator.print_chapters(chapters)
 
-    return 0
+    return exit_code
 
 
 if __name__ == "__main__":
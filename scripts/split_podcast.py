@@ -2,21 +2,25 @@
 
 import os
 import sys
+import json
 import subprocess
 import math
 from pathlib import Path
 
-def get_audio_duration(file_path):
-    """Get the duration of the audio file in seconds."""
+def get_audio_info(file_path):
+    """Get the duration in seconds and first audio stream codec (e.g. 'mp3') with one ffprobe call."""
     cmd = [
         'ffprobe',
         '-v', 'error',
-        '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1',
+        '-select_streams', 'a:0',
+        '-show_entries', 'format=duration:stream=codec_name',
+        '-of', 'json',
         file_path
     ]
     result = subprocess.run(cmd, capture_output=True, text=True)
-    return float(result.stdout.strip())
+    info = json.loads(result.stdout)
+    streams = info.get('streams') or [{}]
+    return float(info['format']['duration']), streams[0].get('codec_name', '')
 
 def split_audio(input_file, chunk_duration_seconds=600, overlap_seconds=3):
     """
@@ -36,15 +40,30 @@ def split_audio(input_file, chunk_duration_seconds=600, overlap_seconds=3):
     output_dir = input_path.parent / f"{input_path.stem}_chunks"
     output_dir.mkdir(exist_ok=True)
 
-    # Get total duration
-    total_duration = get_audio_duration(input_file)
+    # Get total duration and codec
+    total_duration, codec = get_audio_info(input_file)
     print(f"Total duration: {total_duration:.2f} seconds ({total_duration/60:.2f} minutes)")
 
     # Calculate number of chunks
     num_chunks = math.ceil(total_duration / chunk_duration_seconds)
     print(f"Will create approximately {num_chunks} chunks of {chunk_duration_seconds/60:.1f} minutes each")
 
-    chunks = []
+    # MP3 input can be stream-copied into MP3 chunks with no decode/re-encode
+    if codec == 'mp3':
+        print("Input is already MP3, copying audio without re-encoding")
+        codec_args = [
+            '-map', '0:a',        # Audio only (drops embedded cover art)
+            '-c:a', 'copy'        # Byte-copy the MP3 frames
+        ]
+    else:
+        codec_args = [
+            '-c:a', 'libmp3lame', # Use MP3 codec
+            '-b:a', '192k',       # Bitrate
+            '-ar', '44100'        # Sample rate
+        ]
+
+    # Plan every chunk up front so ffmpeg can write them all in one pass
+    planned = []
 
     for i in range(num_chunks):
         # Calculate start time
@@ -70,33 +89,46 @@ def split_audio(input_file, chunk_duration_seconds=600, overlap_seconds=3):
 
         print(f"Creating chunk {i+1}/{num_chunks}: {start_time:.1f}s to {start_time+duration:.1f}s")
 
-        # FFmpeg command
-        cmd = [
-            'ffmpeg',
-            '-i', str(input_file),
-            '-ss', str(start_time),  # Seek to start time
-            '-t', str(duration),     # Duration
-            '-c:a', 'libmp3lame',     # Use MP3 codec
-            '-b:a', '192k',           # Bitrate
-            '-ar', '44100',           # Sample rate
-            '-y',                     # Overwrite output files
-            str(output_file)
+        planned.append({
+            'file': str(output_file),
+            'index': i,
+            'start_offset_seconds': i * chunk_duration_seconds if i > 0 else 0,
+            'duration_seconds': duration,
+            'actual_start_time': start_time
+        })
+
+    # FFmpeg command: a single invocation with one output per chunk. The input
+    # is read once and each output trims its own window from that stream,
+    # rather than spawning ffmpeg per chunk and re-reading up to every offset.
+    cmd = [
+        'ffmpeg',
+        '-nostdin', '-hide_banner',
+        '-loglevel', 'error',     # Only log errors
+        '-y',                     # Overwrite output files
+        '-i', str(input_file)
+    ]
+    for chunk in planned:
+        cmd += [
+            '-ss', str(chunk['actual_start_time']),  # Seek to start time
+            '-t', str(chunk['duration_seconds']),    # Duration
+            *codec_args,
+            chunk['file']
         ]
 
-        # Run FFmpeg
-        result = subprocess.run(cmd, capture_output=True, text=True)
+    # Run FFmpeg
+    chunks = []
+    if planned:
+        # Discard output on the common success path
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if result.returncode != 0:
+            # Re-run once, capturing stderr for a diagnostic
+            result = subprocess.run(cmd, capture_output=True, text=True)
         if result.returncode != 0:
-            print(f"Error creating chunk {i+1}: {result.stderr}")
+            print(f"Error creating chunks: {result.stderr}")
         else:
-            chunk_info = {
-                'file': str(output_file),
-                'index': i,
-                'start_offset_seconds': i * chunk_duration_seconds if i > 0 else 0,
-                'duration_seconds': duration,
-                'actual_start_time': start_time
-            }
-            chunks.append(chunk_info)
-            print(f"  ✓ Saved to {output_file.name}")
+            chunks = planned
+            for chunk in chunks:
+                print(f"  ✓ Saved to {Path(chunk['file']).name}")
 
     print(f"\n✓ Split complete! Created {len(chunks)} chunks in {output_dir}")
 
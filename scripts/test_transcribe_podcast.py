@@ -0,0 +1,40 @@
+from transcribe_podcast import PodcastTranscriber
+
+
+def merge(*chunks, overlap_seconds=3.0):
+    """Merge (offset, segments) chunks the way process_podcast does."""
+    transcriber = PodcastTranscriber.__new__(PodcastTranscriber)
+    rows = []
+    for offset, segments in chunks:
+        chunk_data = {'start_offset_seconds': offset, 'transcript': {'segments': segments}}
+        transcriber._append_chunk(rows, chunk_data, 'episode', overlap_seconds)
+    return [row['text'] for row in rows]
+
+
+def test_overlap_repeated_words_are_dropped():
+    texts = merge(
+        (0, [{'start': 595.0, 'end': 600.0, 'text': 'And so we went to the'}]),
+        (597, [{'start': 0.0, 'end': 4.0, 'text': 'went to the store and bought'},
+               {'start': 4.0, 'end': 8.0, 'text': 'milk today.'}]),
+    )
+    assert texts == ['And so we went to the', 'store and bought', 'milk today.']
+
+
+def test_overlap_partial_boundary_words_are_tolerated():
+    texts = merge(
+        (0, [{'start': 595.0, 'end': 600.0, 'text': 'we went to the st'}]),
+        (597, [{'start': 0.0, 'end': 4.0, 'text': 'ent to the store and bought'}]),
+    )
+    assert texts == ['we went to the st', 'store and bought']
+
+
+def test_overlap_filler_matches_inside_the_head_keep_speech():
+    texts = merge(
+        (0, [{'start': 594.0, 'end': 600.0, 'text': 'and you know, I think it was great'}]),
+        (597, [{'start': 0.5, 'end': 1.0, 'text': 'great.'},
+               {'start': 3.5, 'end': 9.0, 'text': 'So then we went to Paris and, you know, it was amazing.'}]),
+    )
+    assert texts == [
+        'and you know, I think it was great',
+        'So then we went to Paris and, you know, it was amazing.',
+    ]
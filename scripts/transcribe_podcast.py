@@ -1,22 +1,112 @@
 #!/usr/bin/env python3
 
+import io
 import os
+import re
 import json
 import time
+import string
+import hashlib
+import tempfile
+import asyncio
+import argparse
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+import httpx
 import openai
-from openai import OpenAI
+import tiktoken
+from openai import AsyncOpenAI
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from tenacity import retry, retry_if_exception_type, wait_exponential_jitter, stop_after_attempt
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Load environment variables
 load_dotenv()
 
+WHISPER_MODEL = "whisper-1"
+TRANSCRIPTION_LANGUAGE = "en"  # Change if needed
+CHAPTER_MODEL = "gpt-4o-mini"
+CHAPTER_TEMPERATURE = 0.2
+CHAPTER_MAX_PROMPT_TOKENS = 12000  # Transcript token budget for the chapter prompt
+# Fallback tokenizer for models tiktoken does not know about
+DEFAULT_ENCODING = "o200k_base"
+CHAPTER_SYSTEM_PROMPT = "You are an expert at analyzing podcast transcripts and creating clear, helpful chapters."
+
+# API responses are cached here, keyed by a hash of their inputs
+CACHE_DIR = Path(os.getenv("PCC_CACHE_DIR", Path.home() / ".cache" / "pcc"))
+
+_CHUNK_INDEX_RE = re.compile(r'(\d+)')
+
+def chunk_sort_key(path: Path) -> Tuple[int, str]:
+    """Sort chunk files by their numeric index, so chunk_10 comes after chunk_2."""
+    match = _CHUNK_INDEX_RE.search(path.stem)
+    return (int(match.group(1)) if match else -1, path.name)
+
+def transcript_from_rows(segment_rows: List[Dict]) -> Dict[str, Any]:
+    """Project transcript_segments rows into the local {"text", "segments"} layout."""
+    return {
+        "text": " ".join(row['text'] for row in segment_rows),
+        "segments": [
+            {"start": row['start_seconds'], "end": row['end_seconds'], "text": row['text']}
+            for row in segment_rows
+        ]
+    }
+
+def write_json(path: Path, data: Any) -> None:
+    """Write data as indented JSON, using orjson when it is installed."""
+    if orjson is not None:
+        # Much faster than the stdlib encoder for multi-MB transcripts
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+def hash_file(file_path: str) -> str:
+    """SHA-256 of a file's contents, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_load(kind: str, key: str) -> Any:
+    """Return the cached JSON for a key, or None on a miss."""
+    path = CACHE_DIR / kind / f"{key}.json"
+    if not path.exists():
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def cache_store(kind: str, key: str, data: Any) -> None:
+    """Cache JSON for a key, writing atomically so readers never see a partial file."""
+    cache_dir = CACHE_DIR / kind
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', dir=cache_dir, suffix='.tmp', delete=False) as f:
+        json.dump(data, f)
+    os.replace(f.name, cache_dir / f"{key}.json")
+
 class PodcastTranscriber:
     def __init__(self):
-        # Initialize OpenAI
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Initialize OpenAI (async, so many chunks share one event loop). One
+        # keep-alive HTTP/2 client lets concurrent requests share connections
+        self._http = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(600.0, connect=10.0),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32)
+        )
+        # SDK retries are off so tenacity on transcribe_chunk is the only Whisper
+        # retry policy; the chapter request opts back in with with_options()
+        self.openai_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=self._http,
+            max_retries=0
+        )
 
         # Initialize Supabase
         self.supabase: Client = create_client(
@@ -24,9 +114,38 @@ class PodcastTranscriber:
             os.getenv("SUPABASE_SERVICE_ROLE_KEY")
         )
 
-    def transcribe_chunk(self, audio_file_path: str, chunk_index: int) -> Dict[str, Any]:
+        # Chapter model tokenizer, loaded on first use
+        self._encoding = None
+
+    async def __aenter__(self) -> "PodcastTranscriber":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        # Close pooled connections while the event loop is still running
+        await self._http.aclose()
+
+    def get_encoding(self) -> tiktoken.Encoding:
+        """Get the (cached) tokenizer for CHAPTER_MODEL."""
+        if self._encoding is None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(CHAPTER_MODEL)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+        return self._encoding
+
+    @retry(
+        retry=retry_if_exception_type((
+            openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError
+        )),
+        wait=wait_exponential_jitter(1, 60),
+        stop=stop_after_attempt(6),
+        reraise=True
+    )
+    async def transcribe_chunk(self, audio_file_path: str, chunk_index: int) -> Dict[str, Any]:
         """
         Transcribe a single audio chunk using Whisper API.
+        Rate-limited (429), connection and 5xx failures are retried with
+        jittered exponential backoff.
 
         Returns:
             Dict containing transcript text and segments with timestamps
@@ -35,12 +154,13 @@ class PodcastTranscriber:
 
         try:
             with open(audio_file_path, "rb") as audio_file:
-                # Use verbose_json to get timestamps
-                response = self.openai_client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
+                # Use verbose_json to get timestamps. A (name, file, type) tuple lets
+                # the client stream the multipart body rather than buffer the chunk
+                response = await self.openai_client.audio.transcriptions.create(
+                    model=WHISPER_MODEL,
+                    file=(Path(audio_file_path).name, audio_file, "audio/mpeg"),
                     response_format="verbose_json",
-                    language="en"  # Change if needed
+                    language=TRANSCRIPTION_LANGUAGE
                 )
 
             # Extract segments with timestamps
@@ -64,103 +184,224 @@ class PodcastTranscriber:
             print(f"Error transcribing chunk {chunk_index}: {str(e)}")
             raise
 
-    def merge_transcripts(self, chunks_data: List[Dict], overlap_seconds: float = 3.0) -> Dict[str, Any]:
+    async def cached_transcribe(self, audio_file_path: str, chunk_index: int) -> Dict[str, Any]:
         """
-        Merge transcripts from multiple chunks, removing overlaps.
-
-        Args:
-            chunks_data: List of dictionaries containing chunk transcripts and metadata
-            overlap_seconds: Overlap duration to remove from chunk boundaries
+        Transcribe a chunk, reusing a previous Whisper result for identical audio.
 
-        Returns:
-            Merged transcript with adjusted timestamps
+        Results are cached by (audio hash, model, language) under CACHE_DIR/whisper.
         """
-        print("\nMerging transcripts and removing overlaps...")
+        audio_hash = await asyncio.to_thread(hash_file, audio_file_path)
+        key = f"{audio_hash}-{WHISPER_MODEL}-{TRANSCRIPTION_LANGUAGE}"
 
-        merged_segments = []
-        merged_text = []
+        transcript = cache_load("whisper", key)
+        if transcript is not None:
+            print(f"Using cached transcript for chunk {chunk_index + 1}: {Path(audio_file_path).name}")
+            return transcript
 
-        for i, chunk_data in enumerate(chunks_data):
-            chunk_offset = chunk_data['start_offset_seconds']
-            segments = chunk_data['transcript']['segments']
+        transcript = await self.transcribe_chunk(audio_file_path, chunk_index)
+        cache_store("whisper", key, transcript)
+        return transcript
 
-            for seg in segments:
-                # Adjust segment timestamps based on chunk offset
-                adjusted_start = seg['start'] + chunk_offset
-                adjusted_end = seg['end'] + chunk_offset
+    def _append_chunk(self, segment_rows: List[Dict], chunk_data: Dict, episode_id: str, overlap_seconds: float) -> None:
+        """
+        Append one chunk's segments to segment_rows as transcript_segments rows,
+        shifted to episode time. Text repeated from the previous chunk's
+        overlap is trimmed first.
+        """
+        chunk_offset = chunk_data['start_offset_seconds']
+        segments = chunk_data['transcript']['segments']
 
-                # For chunks after the first, skip segments that fall in the overlap region
-                if i > 0:
-                    # Skip segments that start before the overlap boundary
-                    if seg['start'] < overlap_seconds:
-                        continue
+        if segment_rows:
+            segments = self._trim_overlap(segment_rows, segments, chunk_offset, overlap_seconds)
 
-                merged_segments.append({
-                    "start": adjusted_start,
-                    "end": adjusted_end,
-                    "text": seg['text']
-                })
+        for seg in segments:
+            segment_rows.append({
+                'episode_id': episode_id,
+                'start_seconds': seg['start'] + chunk_offset,
+                'end_seconds': seg['end'] + chunk_offset,
+                'text': seg['text']
+            })
 
-        # Sort segments by start time
-        merged_segments.sort(key=lambda x: x['start'])
+    def _trim_overlap(self, segment_rows: List[Dict], segments: List[Dict],
+                      chunk_offset: float, overlap_seconds: float) -> List[Dict]:
+        """
+        Remove the words at the start of a chunk that repeat the end of the previous one.
 
-        # Build merged text
-        merged_text = " ".join([seg['text'] for seg in merged_segments])
+        The end of the previous chunk's tail is aligned with the start of this
+        chunk's head (segments within 2 * overlap_seconds of the boundary), and
+        only the repeated words are dropped. If they don't line up, falls back
+        to skipping segments that start inside the overlap.
+        """
+        # Previous segments ending after one overlap before the boundary
+        tail = []
+        for row in reversed(segment_rows):
+            if row['end_seconds'] <= chunk_offset - overlap_seconds:
+                break
+            tail.append(row)
+        tail.reverse()
+
+        # This chunk's segments starting within two overlaps of its start
+        head_count = 0
+        while head_count < len(segments) and segments[head_count]['start'] < 2 * overlap_seconds:
+            head_count += 1
+
+        prev_tokens = [tok for row in tail for tok in row['text'].split()]
+        next_tokens = [tok for seg in segments[:head_count] for tok in seg['text'].split()]
+
+        drop = self._match_overlap(prev_tokens, next_tokens)
+        if drop is None:
+            return [seg for seg in segments if seg['start'] >= overlap_seconds]
+
+        trimmed = []
+        for seg in segments[:head_count]:
+            tokens = seg['text'].split()
+            if drop >= len(tokens):
+                drop -= len(tokens)
+                continue
+            if drop > 0:
+                seg = {**seg, "text": " ".join(tokens[drop:])}
+                drop = 0
+            trimmed.append(seg)
+
+        return trimmed + segments[head_count:]
+
+    def _match_overlap(self, prev_tail_tokens: List[str], next_head_tokens: List[str],
+                       min_words: int = 2) -> Optional[int]:
+        """
+        Find the words the next chunk's head repeats from the previous chunk's tail.
 
-        return {
-            "text": merged_text,
-            "segments": merged_segments
-        }
+        Only a suffix/prefix alignment counts: a run of at least min_words that
+        ends the tail and starts the head. Either side may have one extra word
+        at the boundary, since the cut can leave a partial word there.
+        Case and surrounding punctuation are ignored.
 
-    def save_to_supabase(self, episode_id: str, transcript_data: Dict) -> List[Dict]:
+        Returns how many leading tokens of next_head_tokens to drop (the
+        matched run, plus a partial first word before it), or None if the
+        two don't line up.
         """
-        Save transcript segments to Supabase database.
+        def normalize(tokens: List[str]) -> List[str]:
+            return [tok.strip(string.punctuation).lower() for tok in tokens]
+
+        prev = normalize(prev_tail_tokens)
+        head = normalize(next_head_tokens)
+
+        # Prefer the longest run, then the one closest to the boundary
+        for size in range(min(len(prev), len(head)), min_words - 1, -1):
+            for tail_skip in (0, 1):
+                tail_end = len(prev) - tail_skip
+                if tail_end < size:
+                    continue
+                for head_skip in (0, 1):
+                    if head_skip + size > len(head):
+                        continue
+                    if prev[tail_end - size:tail_end] == head[head_skip:head_skip + size]:
+                        return head_skip + size
+
+        return None
+
+    def _insert_segments(self, batch: List[Dict]) -> List[Dict]:
+        """Insert one batch of segment rows into Supabase."""
+        return self.supabase.table('transcript_segments').insert(batch).execute().data
+
+    def _delete_segments(self, segment_ids: List, batch_size: int = 200) -> None:
+        """Delete segment rows by id, batch_size ids per request."""
+        for i in range(0, len(segment_ids), batch_size):
+            self.supabase.table('transcript_segments')\
+                .delete()\
+                .in_('id', segment_ids[i:i + batch_size])\
+                .execute()
+
+    async def _rollback_segments(self, saved: List[Dict]) -> None:
+        """Delete the rows this run inserted, so no partial transcript is left behind."""
+        if not saved:
+            return
+        print(f"\n🧹 Removing {len(saved)} segments saved by this run...")
+        try:
+            await asyncio.to_thread(self._delete_segments, [row['id'] for row in saved])
+        except Exception as e:
+            print(f"⚠️  Failed to remove partial segments: {str(e)}")
 
-        Returns:
-            The created segment records
+    async def save_to_supabase(self, segment_queue: asyncio.Queue, batch_size: int = 500) -> List[Dict]:
         """
-        print("\nSaving transcript segments to Supabase...")
+        Save transcript segment rows to Supabase while transcription is still running.
 
-        # Prepare segment records for batch insert
-        segment_records = []
-        for seg in transcript_data['segments']:
-            segment_records.append({
-                'episode_id': episode_id,
-                'start_seconds': seg['start'],
-                'end_seconds': seg['end'],
-                'text': seg['text']
-            })
+        Consumes lists of rows from segment_queue until a None sentinel and
+        inserts them in pages of batch_size on a worker thread. The save is
+        all or nothing: after a failed insert the remaining rows are drained
+        and dropped, and the pages already inserted are deleted again. The
+        database never holds up transcription.
 
-        # Batch insert segments
-        if segment_records:
-            result = self.supabase.table('transcript_segments').insert(segment_records).execute()
-            print(f"✓ Saved {len(segment_records)} segments to Supabase")
-            return result.data
+        Returns:
+            The created segment records, or [] if the save failed
+        """
+        pending = []
+        saved = []
+        failed = False
+        done = False
+
+        while not done:
+            rows = await segment_queue.get()
+            if rows is None:
+                done = True
+            elif not failed:
+                pending.extend(rows)
+
+            # Insert full pages as they fill up; flush the remainder at the end
+            while pending and (done or len(pending) >= batch_size):
+                batch, pending = pending[:batch_size], pending[batch_size:]
+                try:
+                    saved.extend(await asyncio.to_thread(self._insert_segments, batch))
+                except Exception as e:
+                    print(f"⚠️  Failed to save to Supabase: {str(e)}")
+                    failed = True
+                    pending = []
+                    break
+                print(f"  Inserted {len(saved)} segments into Supabase")
+
+        if failed:
+            await self._rollback_segments(saved)
+            return []
 
-        return []
+        if saved:
+            print(f"✓ Saved {len(saved)} segments to Supabase")
+        return saved
 
-    def generate_chapters(self, transcript_data: Dict) -> List[Dict]:
+    async def generate_chapters(self, segment_rows: List[Dict]) -> List[Dict]:
         """
-        Use GPT to generate chapters from the transcript.
+        Use GPT to generate chapters from the transcript's segment rows.
 
         Returns:
             List of chapters with titles and timestamps
         """
         print("\nGenerating chapters with GPT...")
 
-        # Prepare segments for GPT
-        segments_text = self._prepare_segments_for_gpt(transcript_data['segments'])
+        # Prepare segments for GPT; a tokenizer load failure (e.g. no network
+        # to fetch the encoding) is a chapter error, not a fatal one
+        try:
+            segments_text, last_end, segment_count = self._prepare_segments_for_gpt(segment_rows)
+        except Exception as e:
+            print(f"Error preparing transcript for chapters: {str(e)}")
+            return []
+
+        prompt = self._build_chapters_prompt(segments_text, last_end, segment_count)
 
-        prompt = self._build_chapters_prompt(segments_text)
+        # Identical prompts get identical chapters; don't pay for them twice
+        key = hashlib.sha256(
+            f"{CHAPTER_SYSTEM_PROMPT}{prompt}{CHAPTER_MODEL}{CHAPTER_TEMPERATURE}".encode()
+        ).hexdigest()
+        chapters = cache_load("chapters", key)
+        if chapters is not None:
+            print("  Using cached chapters")
+            return chapters
 
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                temperature=0.2,
+            response = await self.openai_client.with_options(max_retries=2).chat.completions.create(
+                model=CHAPTER_MODEL,
+                temperature=CHAPTER_TEMPERATURE,
                 messages=[
                     {
                         "role": "system",
-                        "content": "You are an expert at analyzing podcast transcripts and creating clear, helpful chapters."
+                        "content": CHAPTER_SYSTEM_PROMPT
                     },
                     {
                         "role": "user",
@@ -172,59 +413,72 @@ class PodcastTranscriber:
 
             content = response.choices[0].message.content
             result = json.loads(content)
-            return result.get('chapters', [])
+            chapters = result.get('chapters', [])
 
         except Exception as e:
             print(f"Error generating chapters: {str(e)}")
             return []
 
-    def _prepare_segments_for_gpt(self, segments: List[Dict], max_chars: int = 50000) -> str:
+        if chapters:
+            cache_store("chapters", key, chapters)
+        return chapters
+
+    def _prepare_segments_for_gpt(self, segment_rows: List[Dict],
+                                  max_tokens: int = CHAPTER_MAX_PROMPT_TOKENS) -> Tuple[str, float, int]:
         """
-        Prepare segments text for GPT, with timestamps and length limit.
-        Uses smart sampling to cover the entire podcast if it exceeds max_chars.
+        Prepare segment rows text for GPT, with timestamps and a token budget.
+        Uses smart sampling to cover the entire podcast if it exceeds max_tokens.
+
+        Returns:
+            (segments text, end time of the last segment, number of segments)
         """
-        # First, try to fit everything
-        full_text = []
-        total_length = 0
-        for seg in segments:
-            line = f"[{seg['start']:.1f}-{seg['end']:.1f}] {seg['text']}\n"
-            total_length += len(line)
-            full_text.append(line)
+        if not segment_rows:
+            return "", 0.0, 0
+
+        last_end = segment_rows[-1]['end_seconds']
+        enc = self.get_encoding()
+
+        # Format and count lines, stopping as soon as the budget is blown
+        buffer = io.StringIO()
+        total_tokens = 0
+        counted = 0
+        for row in segment_rows:
+            line = f"[{row['start_seconds']:.1f}-{row['end_seconds']:.1f}] {row['text']}\n"
+            total_tokens += len(enc.encode(line, disallowed_special=()))
+            counted += 1
+            if total_tokens > max_tokens:
+                break
+            buffer.write(line)
 
         # If it fits, return everything
-        if total_length <= max_chars:
-            return "".join(full_text)
+        if total_tokens <= max_tokens:
+            return buffer.getvalue(), last_end, len(segment_rows)
 
         # Otherwise, sample evenly across the entire podcast
-        print(f"  Transcript too long ({total_length} chars), sampling evenly...")
-
-        # Calculate how many segments we can include
-        avg_line_length = total_length / len(segments)
-        segments_to_include = int(max_chars / avg_line_length)
+        print(f"  Transcript too long (over {max_tokens:,} tokens), sampling evenly...")
 
-        # Sample evenly throughout the podcast
-        step = len(segments) / segments_to_include
-        sampled_indices = [int(i * step) for i in range(segments_to_include)]
+        # Calculate how many segments we can include, from the lines counted so far
+        avg_line_tokens = total_tokens / counted
+        segments_to_include = max(1, int(max_tokens / avg_line_tokens))
 
-        result = []
-        result.append(f"[NOTE: Sampled {segments_to_include} of {len(segments)} segments evenly across the podcast]\n\n")
+        # Sample evenly throughout the podcast, formatting only the sampled segments
+        step = len(segment_rows) / segments_to_include
+        buffer = io.StringIO()
+        buffer.write(f"[NOTE: Sampled {segments_to_include} of {len(segment_rows)} segments evenly across the podcast]\n\n")
 
-        for idx in sampled_indices:
-            if idx < len(segments):
-                seg = segments[idx]
-                line = f"[{seg['start']:.1f}-{seg['end']:.1f}] {seg['text']}\n"
-                result.append(line)
+        for i in range(segments_to_include):
+            row = segment_rows[int(i * step)]
+            buffer.write(f"[{row['start_seconds']:.1f}-{row['end_seconds']:.1f}] {row['text']}\n")
 
-        return "".join(result)
+        return buffer.getvalue(), last_end, len(segment_rows)
 
-    def _build_chapters_prompt(self, segments_text: str) -> str:
+    def _build_chapters_prompt(self, segments_text: str, last_end: float, segment_count: int) -> str:
         """
         Build the prompt for chapter generation.
+
+        last_end is the end time of the final segment, used as the episode duration.
         """
-        # Extract the last timestamp to know the full duration
-        import re
-        timestamps = re.findall(r'\[(\d+\.\d+)-\d+\.\d+\]', segments_text)
-        last_timestamp = float(timestamps[-1]) if timestamps else 3000
+        last_timestamp = last_end if segment_count else 3000
         duration_minutes = int(last_timestamp / 60)
 
         return f"""
@@ -267,12 +521,11 @@ Transcript with timestamps (may be sampled if long):
             return
 
         chapters_file = output_path / "chapters.json"
-        with open(chapters_file, 'w') as f:
-            json.dump(chapters, f, indent=2)
+        write_json(chapters_file, chapters)
 
         print(f"✓ Saved {len(chapters)} chapters to {chapters_file.name}")
 
-    def process_podcast(self, episode_id: str, chunks_dir: str, overlap_seconds: float = 3.0):
+    async def process_podcast(self, episode_id: str, chunks_dir: str, overlap_seconds: float = 3.0, concurrency: int = 5):
         """
         Main method to process a podcast: transcribe chunks, merge, generate chapters, and save.
 
@@ -280,96 +533,132 @@ Transcript with timestamps (may be sampled if long):
             episode_id: UUID of the episode in the database
             chunks_dir: Directory containing the audio chunks
             overlap_seconds: Overlap between chunks in seconds
+            concurrency: Maximum number of chunks transcribed at once
         """
         chunks_path = Path(chunks_dir)
 
         # Find all chunk files
-        chunk_files = sorted(chunks_path.glob("chunk_*.mp3"))
+        chunk_files = sorted(chunks_path.glob("chunk_*.mp3"), key=chunk_sort_key)
         if not chunk_files:
             raise ValueError(f"No chunk files found in {chunks_dir}")
 
         print(f"Found {len(chunk_files)} chunks to process")
 
+        # Ask the kernel to start reading every chunk now, so the concurrent
+        # uploads below are served from the page cache
+        if hasattr(os, 'posix_fadvise'):
+            for chunk_file in chunk_files:
+                fd = os.open(chunk_file, os.O_RDONLY)
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                finally:
+                    os.close(fd)
+
         # Read metadata if available
         metadata_file = chunks_path / "chunks_metadata.txt"
         chunk_duration = 600  # Default 10 minutes
 
-        # Transcribe each chunk
-        chunks_data = []
-        for i, chunk_file in enumerate(chunk_files):
-            print(f"\n--- Processing chunk {i+1}/{len(chunk_files)} ---")
-
-            # Calculate start offset (considering overlap)
-            start_offset = i * chunk_duration if i == 0 else i * chunk_duration - overlap_seconds
-
-            # Transcribe
-            transcript = self.transcribe_chunk(str(chunk_file), i)
-
-            chunks_data.append({
-                'file': str(chunk_file),
-                'index': i,
-                'start_offset_seconds': start_offset,
-                'transcript': transcript
-            })
+        # Transcribe chunks concurrently; Whisper latency, not CPU, is the bottleneck
+        print(f"Transcribing with up to {concurrency} concurrent requests")
+        semaphore = asyncio.Semaphore(concurrency)
 
-            # Small delay to avoid rate limits
-            if i < len(chunk_files) - 1:
-                time.sleep(1)
+        async def transcribe_with_limit(chunk_file: Path, i: int):
+            async with semaphore:
+                transcript = await self.cached_transcribe(str(chunk_file), i)
+            print(f"  ✓ Chunk {i+1}/{len(chunk_files)} transcribed")
+            return i, transcript
 
-        # Merge transcripts
-        merged_transcript = self.merge_transcripts(chunks_data, overlap_seconds)
+        # Segments are inserted into Supabase as soon as they are merged
+        print("\n💾 Streaming segments to Supabase as chunks finish...")
+        segment_queue = asyncio.Queue()
+        uploader = asyncio.create_task(self.save_to_supabase(segment_queue))
 
-        # FIRST: Save everything locally before any database operations
+        chunks_data = []
+        segment_rows = []
+        finished = {}  # transcripts waiting on an earlier chunk
+        first_error = None
+
+        tasks = [transcribe_with_limit(chunk_file, i) for i, chunk_file in enumerate(chunk_files)]
+        for next_done in asyncio.as_completed(tasks):
+            # Let every request settle (and get cached) before failing
+            try:
+                i, transcript = await next_done
+            except Exception as e:
+                first_error = first_error or e
+                continue
+            finished[i] = transcript
+
+            # Merge, in order, every chunk whose predecessors are merged
+            while len(chunks_data) in finished:
+                i = len(chunks_data)
+                # Calculate start offset (considering overlap)
+                start_offset = i * chunk_duration if i == 0 else i * chunk_duration - overlap_seconds
+
+                chunk_data = {
+                    'file': str(chunk_files[i]),
+                    'index': i,
+                    'start_offset_seconds': start_offset,
+                    'transcript': finished.pop(i)
+                }
+                chunks_data.append(chunk_data)
+
+                # Rows already merged never change, so they can be saved now
+                first_new = len(segment_rows)
+                self._append_chunk(segment_rows, chunk_data, episode_id, overlap_seconds)
+                segment_queue.put_nowait(segment_rows[first_new:])
+
+        segment_queue.put_nowait(None)
+        if first_error:
+            # Don't leave a partial transcript behind for an episode that failed
+            await self._rollback_segments(await uploader)
+            raise first_error
+
+        # FIRST: Save everything locally, before anything below can fail
         print("\n📁 Saving transcript data locally...")
 
-        # Save merged transcript locally
+        # Save merged transcript locally; chapters and database status are
+        # added in one final write
         output_file = chunks_path / "transcript_full.json"
-        with open(output_file, 'w') as f:
-            json.dump({
-                'episode_id': episode_id,
-                'transcript': merged_transcript,
-                'chunks_processed': len(chunks_data),
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-            }, f, indent=2)
+        transcript_record = {
+            'episode_id': episode_id,
+            'transcript': transcript_from_rows(segment_rows),
+            'chunks_processed': len(chunks_data),
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        write_json(output_file, transcript_record)
         print(f"✓ Saved full transcript to: {output_file}")
 
-        # Generate chapters
-        chapters = self.generate_chapters(merged_transcript)
-        if chapters:
-            self.save_chapters_locally(chapters, chunks_path)
-
         # Save individual chunk transcripts for reference
         chunks_file = chunks_path / "chunk_transcripts.json"
-        with open(chunks_file, 'w') as f:
-            json.dump({
-                'episode_id': episode_id,
-                'chunks': chunks_data,
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-            }, f, indent=2)
+        write_json(chunks_file, {
+            'episode_id': episode_id,
+            'chunks': chunks_data,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        })
         print(f"✓ Saved chunk transcripts to: {chunks_file}")
 
-        # NOW: Try to save to Supabase
-        segment_records = []
         try:
-            print("\n💾 Attempting to save to Supabase...")
-            segment_records = self.save_to_supabase(episode_id, merged_transcript)
-            print(f"✓ Successfully saved {len(segment_records)} segments to Supabase")
-        except Exception as e:
-            print(f"⚠️  Failed to save to Supabase: {str(e)}")
+            # Generate chapters while the last segments are still uploading
+            chapters = await self.generate_chapters(segment_rows)
+            if chapters:
+                self.save_chapters_locally(chapters, chunks_path)
+        finally:
+            # Wait for the remaining segment inserts
+            segment_records = await uploader
+
+        if len(segment_records) < len(segment_rows):
+            print(f"⚠️  Only {len(segment_records)}/{len(segment_rows)} segments reached Supabase")
             print("✓ But don't worry - all data is safely saved locally!")
 
-        # Update the local file with database status
-        with open(output_file, 'r') as f:
-            data = json.load(f)
-        data['chapters'] = chapters
-        data['segments_saved_to_db'] = len(segment_records)
-        data['db_save_successful'] = len(segment_records) > 0
-        with open(output_file, 'w') as f:
-            json.dump(data, f, indent=2)
+        # Update the local file with chapters and database status
+        transcript_record['chapters'] = chapters
+        transcript_record['segments_saved_to_db'] = len(segment_records)
+        transcript_record['db_save_successful'] = len(segment_records) == len(segment_rows)
+        write_json(output_file, transcript_record)
 
         print(f"\n✓ Complete! Transcript and chapters saved.")
         print(f"  - Episode ID: {episode_id}")
-        print(f"  - Local transcript segments: {len(merged_transcript['segments'])}")
+        print(f"  - Local transcript segments: {len(segment_rows)}")
         print(f"  - Segments in database: {len(segment_records)}")
         print(f"  - Chapters created: {len(chapters)}")
         print(f"  - Local files: {output_file.name}, {chunks_file.name}")
@@ -381,6 +670,11 @@ Transcript with timestamps (may be sampled if long):
         }
 
 def main():
+    parser = argparse.ArgumentParser(description='Transcribe podcast chunks and generate chapters')
+    parser.add_argument('--concurrency', type=int, default=5, help='Max concurrent Whisper requests (default: 5)')
+
+    args = parser.parse_args()
+
     # Check for required environment variables
     required_env = ["OPENAI_API_KEY", "SUPABASE_URL", "SUPABASE_SERVICE_ROLE_KEY"]
     missing = [var for var in required_env if not os.getenv(var)]
@@ -401,12 +695,18 @@ def main():
 
     chunks_dir = "/Users/mokes/projects/pcc_new/scripts/podcasts/default.mp3_ywr3ahjkcgo_1e21bb7e44ca33faac964752e07ab898_49864301_chunks"
 
+    async def run() -> Dict[str, Any]:
+        # The transcriber owns its HTTP client; leaving the block closes it
+        async with transcriber:
+            return await transcriber.process_podcast(
+                episode_id=episode_id,
+                chunks_dir=chunks_dir,
+                overlap_seconds=3.0,
+                concurrency=args.concurrency
+            )
+
     try:
-        result = transcriber.process_podcast(
-            episode_id=episode_id,
-            chunks_dir=chunks_dir,
-            overlap_seconds=3.0
-        )
+        result = asyncio.run(run())
         print(f"\n🎉 Success! Processed podcast with episode ID: {episode_id}")
 
     except Exception as e:
@@ -12,6 +12,11 @@ import argparse
 # Load environment variables
 load_dotenv()
 
+def _chunked(seq: List, n: int = 1000):
+    """Yield successive n-sized slices of seq."""
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
 class ChapterUploader:
     def __init__(self):
         # Initialize Supabase
@@ -25,9 +30,10 @@ class ChapterUploader:
         with open(chapters_file, 'r') as f:
             return json.load(f)
 
-    def upload_chapters(self, episode_id: str, chapters: List[Dict]) -> List[Dict]:
+    def upload_chapters(self, episode_id: str, chapters: List[Dict], batch_size: int = 1000) -> List[Dict]:
         """
-        Upload chapters to Supabase chapters table.
+        Upsert chapters into Supabase chapters table, batch_size rows per request.
+        Rows matching an existing (episode_id, start_seconds) are updated in place.
         """
         print(f"\n📤 Uploading {len(chapters)} chapters to Supabase...")
         print(f"   Episode ID: {episode_id}")
@@ -45,12 +51,23 @@ class ChapterUploader:
                 'description': chapter.get('summary', '')  # Using description field for summary
             })
 
+        # One row per start time; an upsert batch can't touch the same row twice
+        deduped = list({record['start_seconds']: record for record in chapter_records}.values())
+        if len(deduped) < len(chapter_records):
+            print(f"   Dropped {len(chapter_records) - len(deduped)} chapters with duplicate start times")
+        chapter_records = deduped
+
         # Upload to Supabase
         if chapter_records:
             try:
-                result = self.supabase.table('chapters').insert(chapter_records).execute()
+                uploaded = []
+                for batch in _chunked(chapter_records, batch_size):
+                    result = self.supabase.table('chapters')\
+                        .upsert(batch, on_conflict='episode_id,start_seconds')\
+                        .execute()
+                    uploaded.extend(result.data)
                 print(f"✓ Successfully uploaded {len(chapter_records)} chapters")
-                return result.data
+                return uploaded
             except Exception as e:
                 print(f"❌ Failed to upload chapters: {str(e)}")
                 return []
@@ -69,20 +86,21 @@ class ChapterUploader:
             print(f"Error checking existing chapters: {str(e)}")
             return []
 
-    def delete_existing_chapters(self, episode_id: str) -> bool:
-        """Delete existing chapters for this episode."""
+    def delete_stale_chapters(self, episode_id: str, start_seconds: List) -> bool:
+        """Delete chapters for this episode whose start time is not in start_seconds."""
         try:
             result = self.supabase.table('chapters')\
                 .delete()\
                 .eq('episode_id', episode_id)\
+                .not_.in_('start_seconds', start_seconds)\
                 .execute()
 
             deleted_count = len(result.data) if result.data else 0
             if deleted_count > 0:
-                print(f"  Deleted {deleted_count} existing chapters")
+                print(f"  Deleted {deleted_count} stale chapters")
             return True
         except Exception as e:
-            print(f"Error deleting existing chapters: {str(e)}")
+            print(f"Error deleting stale chapters: {str(e)}")
             return False
 
     def process(self, episode_id: str, chapters_file: str, replace: bool = False):
@@ -111,18 +129,20 @@ class ChapterUploader:
             print(f"\n⚠️  Found {len(existing)} existing chapter markers")
             if replace:
                 print("   Replacing existing chapters...")
-                self.delete_existing_chapters(episode_id)
             else:
                 response = input("   Replace existing chapters? (y/n): ")
-                if response.lower() == 'y':
-                    self.delete_existing_chapters(episode_id)
-                else:
+                if response.lower() != 'y':
                     print("   Skipping upload to preserve existing chapters")
                     return
 
-        # Upload new chapters
+        # Upsert new chapters; existing rows are overwritten in place so the
+        # episode is never left without chapters
         uploaded = self.upload_chapters(episode_id, chapters)
 
+        # Prune old chapters whose start time no longer appears
+        if uploaded and existing:
+            self.delete_stale_chapters(episode_id, [c['start_seconds'] for c in chapters])
+
         if uploaded:
             print(f"\n✅ Successfully uploaded {len(uploaded)} chapters to Supabase")
             print(f"   Episode ID: {episode_id}")
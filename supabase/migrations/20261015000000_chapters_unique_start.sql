@@ -0,0 +1,18 @@
+-- Make (episode_id, start_seconds) unique on chapters so uploads can upsert
+BEGIN;
+
+-- The old index of the same columns was non-unique; CREATE ... IF NOT EXISTS
+-- under its name would silently keep it
+DROP INDEX IF EXISTS public.chapters_time_idx;
+
+-- Remove duplicate chapters, keeping the most recently inserted row
+DELETE FROM public.chapters older
+USING public.chapters newer
+WHERE older.episode_id = newer.episode_id
+  AND older.start_seconds = newer.start_seconds
+  AND older.id < newer.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS chapters_episode_start_key
+  ON public.chapters USING btree (episode_id, start_seconds);
+
+COMMIT;